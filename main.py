@@ -1,29 +1,43 @@
 import os
+import asyncio
+import csv
 import re
-import json
 import logging
-from typing import List, Dict
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import List, Dict, Optional
+import orjson
 from fastapi import FastAPI, File, UploadFile, HTTPException, status
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-import pandas as pd
-from io import BytesIO
-from openai import OpenAI
+from io import BytesIO, StringIO
+import httpx
+from openai import AsyncOpenAI
 from openai.types.chat import ChatCompletion
+import pypdfium2 as pdfium
 from pypdf import PdfReader
 from docx import Document
-import time
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Release pooled OpenAI connections on shutdown"""
+    yield
+    await client.close()
+
 app = FastAPI(
     title="Smart Resume Analyzer API",
     description="API for automated resume ranking against job descriptions",
     version="2.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -33,23 +47,102 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Configure OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY", ""))
+# Configure OpenAI client with a pooled HTTP/2 connection shared across requests
+client = AsyncOpenAI(
+    api_key=os.getenv("OPENAI_API_KEY", ""),
+    http_client=httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=64, max_keepalive_connections=64),
+        timeout=15
+    )
+)
 
 # Constants
 MAX_FILES = 20
 MAX_CRITERIA = 15
+MAX_CONCURRENT_RESUMES = 8
+CRITERIA_CACHE_SIZE = 128
+MAX_UPLOAD_BYTES = 8 * 1024 * 1024
+UPLOAD_CHUNK_BYTES = 64 * 1024
 ALLOWED_MIME_TYPES = {
     "application/pdf": "pdf",
     "application/vnd.openxmlformats-officedocument.wordprocessingml.document": "docx"
 }
 
+# System prompts shared by all LLM calls
+CRITERIA_SYSTEM_PROMPT = """You are a senior HR analyst. Extract measurable, objective criteria:
+- Technical skills with proficiency levels
+- Required certifications
+- Experience requirements (years/technologies)
+- Education qualifications
+Exclude soft skills and company-specific information."""
+NAME_SYSTEM_PROMPT = "You are an expert resume parser. Extract resume information accurately."
+SCORING_SYSTEM_PROMPT = "You are a technical recruiter. Score resumes objectively."
+
+# Precompiled patterns used on every request
+RESPONSE_PREFIX_RE = re.compile(r'(?i)^\s*(json|response|criteria)\s*[:\-]?\s*')
+COLUMN_NAME_RE = re.compile(r'[^a-zA-Z0-9_]')
+CANDIDATE_NAME_RE = re.compile(r'^[A-Z][a-z]+(\s[A-Z][a-z]+)+$')
+# Resume header heuristics: a name line needs contact details right below it
+HEADER_NAME_RE = re.compile(r"^[A-Z][A-Za-z'-]+(?:\s+(?:[A-Z]\.|[A-Z][A-Za-z'-]+)){1,3}$")
+CONTACT_RE = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+|\+?\d[\d\s().-]{7,}\d")
+NAME_CONTACT_LINES = 3
+# Words that mark a header line as a heading, job title or place rather than a name
+NON_NAME_WORDS = {
+    # Section headings
+    "resume", "curriculum", "vitae", "cover", "letter", "about", "me", "profile",
+    "summary", "objective", "contact", "personal", "details", "information",
+    "experience", "education", "skills", "technical", "professional", "career",
+    "work", "employment", "history", "key", "achievements", "portfolio", "references",
+    # Job titles
+    "senior", "junior", "lead", "principal", "staff", "software", "data",
+    "engineer", "developer", "scientist", "analyst", "manager", "consultant",
+    "designer", "architect", "administrator", "specialist", "director", "intern",
+    # Places
+    "new", "york", "san", "los", "city", "street", "road", "avenue",
+    "alabama", "alaska", "arizona", "arkansas", "california", "colorado",
+    "connecticut", "delaware", "florida", "georgia", "hawaii", "idaho", "illinois",
+    "indiana", "iowa", "kansas", "kentucky", "louisiana", "maine", "maryland",
+    "massachusetts", "michigan", "minnesota", "mississippi", "missouri", "montana",
+    "nebraska", "nevada", "hampshire", "jersey", "mexico", "carolina", "dakota",
+    "ohio", "oklahoma", "oregon", "pennsylvania", "rhode", "island", "tennessee",
+    "texas", "utah", "vermont", "virginia", "washington", "wisconsin", "wyoming"
+}
+
+# PDFium is not thread-safe, even across documents; serialize every call into it
+pdfium_lock = threading.Lock()
+
+# Extracted criteria keyed by SHA-256 of the uploaded job description
+criteria_cache: "OrderedDict[bytes, List[str]]" = OrderedDict()
+
 class APIError(Exception):
     """Custom exception for API errors"""
     def __init__(self, message: str, status_code: int):
         super().__init__(message)
         self.status_code = status_code
 
+def get_cached_criteria(key: bytes) -> Optional[List[str]]:
+    """Look up criteria previously extracted from the same document"""
+    criteria = criteria_cache.get(key)
+    if criteria is None:
+        return None
+    criteria_cache.move_to_end(key)
+    return list(criteria)
+
+def cache_criteria(key: bytes, criteria: List[str]):
+    """Remember extracted criteria, evicting the least recently used entry"""
+    criteria_cache[key] = list(criteria)
+    criteria_cache.move_to_end(key)
+    if len(criteria_cache) > CRITERIA_CACHE_SIZE:
+        criteria_cache.popitem(last=False)
+
+def upload_too_large(file: UploadFile) -> APIError:
+    """Build the error for an upload over MAX_UPLOAD_BYTES"""
+    return APIError(
+        f"File {file.filename} exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit",
+        status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    )
+
 def validate_inputs(files: List[UploadFile], criteria: List[str] = None):
     """Validate input files and criteria"""
     if len(files) > MAX_FILES:
@@ -64,15 +157,44 @@ def validate_inputs(files: List[UploadFile], criteria: List[str] = None):
                 f"Unsupported file type: {file.content_type}. Allowed: PDF, DOCX",
                 status.HTTP_400_BAD_REQUEST
             )
+        if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+            raise upload_too_large(file)
+
+async def read_upload(file: UploadFile) -> bytes:
+    """Read an upload in chunks, rejecting files over the size limit"""
+    buffer = BytesIO()
+    while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+        if buffer.tell() + len(chunk) > MAX_UPLOAD_BYTES:
+            raise upload_too_large(file)
+        buffer.write(chunk)
+    return buffer.getvalue()
+
+def extract_pdf_text(content: bytes) -> str:
+    """Extract PDF text with PDFium, falling back to pypdf for files it rejects"""
+    try:
+        with pdfium_lock:
+            pdf = pdfium.PdfDocument(content)
+            try:
+                pages = []
+                for page in pdf:
+                    textpage = page.get_textpage()
+                    pages.append(textpage.get_text_bounded())
+                    textpage.close()
+                    page.close()
+                return "\n".join(pages)
+            finally:
+                pdf.close()
+    except pdfium.PdfiumError as e:
+        logger.warning(f"PDFium extraction failed, using pypdf: {str(e)}")
+        reader = PdfReader(BytesIO(content))
+        return "\n".join(page.extract_text() or "" for page in reader.pages)
 
-def extract_text(file: UploadFile) -> str:
+def extract_text(content: bytes, content_type: str) -> str:
     """Robust text extraction from PDF/DOCX files"""
     try:
-        content = file.file.read()
-        if file.content_type == "application/pdf":
-            reader = PdfReader(BytesIO(content))
-            return "\n".join(page.extract_text() or "" for page in reader.pages)
-        elif "wordprocessingml.document" in file.content_type:
+        if content_type == "application/pdf":
+            return extract_pdf_text(content)
+        elif "wordprocessingml.document" in content_type:
             doc = Document(BytesIO(content))
             return "\n".join(para.text for para in doc.paragraphs if para.text.strip())
         return ""
@@ -89,7 +211,7 @@ async def get_llm_response(prompt: str, system_msg: str, json_mode: bool = False
     
     for attempt in range(3):
         try:
-            response: ChatCompletion = client.chat.completions.create(
+            response: ChatCompletion = await client.chat.completions.create(
                 model="gpt-3.5-turbo-0125",
                 messages=messages,
                 temperature=0.1,
@@ -106,17 +228,17 @@ async def get_llm_response(prompt: str, system_msg: str, json_mode: bool = False
             if attempt == 2:
                 logger.error(f"LLM API failed: {str(e)}")
                 raise APIError("LLM service unavailable", status.HTTP_503_SERVICE_UNAVAILABLE)
-            time.sleep(0.5 * (attempt + 1))
+            await asyncio.sleep(0.5 * (attempt + 1))
 
 def parse_criteria_response(response: str) -> List[str]:
     """Advanced criteria parsing with multiple fallback strategies"""
     try:
         # Clean JSON response
-        response = re.sub(r'(?i)^\s*(json|response|criteria)\s*[:\-]?\s*', '', response)
+        response = RESPONSE_PREFIX_RE.sub('', response)
         response = response.strip('` \n\t\r')
         
         # Parse JSON
-        data = json.loads(response)
+        data = orjson.loads(response)
         
         # Handle various JSON structures
         if isinstance(data, list):
@@ -133,35 +255,97 @@ def parse_criteria_response(response: str) -> List[str]:
                     return value
         
         raise ValueError("Unsupported JSON structure")
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         # Fallback to line parsing
         lines = [line.strip(' -*•') for line in response.split('\n') if line.strip()]
         return lines[:MAX_CRITERIA]
 
 def sanitize_column_name(name: str) -> str:
     """Create safe column names for CSV"""
-    return re.sub(r'[^a-zA-Z0-9_]', '_', name)[:50]
+    return COLUMN_NAME_RE.sub('_', name)[:50]
 
 def validate_score(score: int) -> int:
     """Ensure scores are within 0-5 range"""
     return max(0, min(5, score))
 
+def find_header_name(text: str) -> str:
+    """Return the first resume line if it is clearly the candidate's name"""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if not lines or not HEADER_NAME_RE.match(lines[0]):
+        return ""
+    words = lines[0].split()
+    if any(word.strip(".'-").lower() in NON_NAME_WORDS for word in words):
+        return ""
+    if not any(CONTACT_RE.search(line) for line in lines[1:NAME_CONTACT_LINES + 1]):
+        return ""
+    name = " ".join(words)
+    return name.title() if name.isupper() else name
+
 async def extract_candidate_name(text: str) -> str:
     """Accurate name extraction from resume text"""
+    # Most resumes open with the name; skip the LLM round-trip when it does
+    name = find_header_name(text)
+    if name:
+        return name
+    
     prompt = f"""Extract the candidate's full name from this resume. 
     Return ONLY the name in format 'FirstName LastName'. 
     If not found, return 'Unknown Candidate'.\n\n{text[:3000]}"""
     
     response = await get_llm_response(
         prompt=prompt,
-        system_msg="You are an expert resume parser. Extract resume information accurately."
+        system_msg=NAME_SYSTEM_PROMPT
     )
     
     # Validate name format
-    if re.match(r'^[A-Z][a-z]+(\s[A-Z][a-z]+)+$', response):
+    if CANDIDATE_NAME_RE.match(response):
         return response
     return "Unknown Candidate"
 
+def parse_scores_response(response: str, expected: int) -> List[int]:
+    """Parse a batched scoring reply into one clamped score per criterion"""
+    data = orjson.loads(response)
+    if isinstance(data, dict):
+        data = data.get("scores")
+    if not isinstance(data, list) or len(data) != expected:
+        raise ValueError("Score count does not match criteria")
+    return [validate_score(int(score)) for score in data]
+
+def format_criteria(criteria: List[str]) -> str:
+    """Render criteria as a numbered list for scoring prompts"""
+    return "\n".join(f"{i + 1}. {c}" for i, c in enumerate(criteria))
+
+async def score_resume(text: str, criteria_list: str, criteria_count: int) -> List[int]:
+    """Score a resume against all criteria in a single LLM call"""
+    prompt = f"""Evaluate this resume against each numbered criterion.
+    Score each 0-5 based on explicit mentions and relevance.
+    Return JSON format: {{"scores": [int, ...]}} with one score per criterion, in order.
+    Criteria:\n{criteria_list}\n\nResume Excerpt:\n{text[:5000]}"""
+    
+    response = await get_llm_response(
+        prompt=prompt,
+        system_msg=SCORING_SYSTEM_PROMPT,
+        json_mode=True
+    )
+    return parse_scores_response(response, criteria_count)
+
+async def score_file(file: UploadFile, criteria: List[str], criteria_list: str) -> Dict:
+    """Build one CSV row of candidate name, per-criterion scores and total"""
+    content = await read_upload(file)
+    text = await asyncio.to_thread(extract_text, content, file.content_type)
+    candidate_name = await extract_candidate_name(text)
+    
+    scores = {"Candidate Name": candidate_name}
+    total = 0
+    
+    criterion_scores = await score_resume(text, criteria_list, len(criteria))
+    for criterion, score in zip(criteria, criterion_scores):
+        scores[criterion] = score
+        total += score
+    
+    scores["Total Score"] = total
+    return scores
+
 @app.post("/extract-criteria",
          summary="Extract key criteria from job description",
          responses={
@@ -185,26 +369,29 @@ async def extract_criteria(file: UploadFile = File(...)):
     """
     try:
         validate_inputs([file])
-        text = extract_text(file)
+        content = await read_upload(file)
         
-        system_msg = """You are a senior HR analyst. Extract measurable, objective criteria:
-        - Technical skills with proficiency levels
-        - Required certifications
-        - Experience requirements (years/technologies)
-        - Education qualifications
-        Exclude soft skills and company-specific information."""
+        # Identical uploads skip parsing and the LLM call entirely
+        cache_key = hashlib.sha256(content).digest()
+        cached = get_cached_criteria(cache_key)
+        if cached is not None:
+            return ORJSONResponse({"criteria": cached})
+        
+        text = await asyncio.to_thread(extract_text, content, file.content_type)
         
         prompt = f"""Analyze this job description and extract key ranking criteria.
         Return JSON format: {{"criteria": ["item1", "item2"]}}
         Job Description:\n{text[:10000]}"""
         
-        raw_response = await get_llm_response(prompt, system_msg, json_mode=True)
+        raw_response = await get_llm_response(prompt, CRITERIA_SYSTEM_PROMPT, json_mode=True)
         criteria = parse_criteria_response(raw_response)
         
         if not criteria:
             raise APIError("No criteria extracted", status.HTTP_500_INTERNAL_SERVER_ERROR)
             
-        return JSONResponse({"criteria": criteria[:MAX_CRITERIA]})
+        criteria = criteria[:MAX_CRITERIA]
+        cache_criteria(cache_key, criteria)
+        return ORJSONResponse({"criteria": criteria})
     
     except APIError as e:
         raise HTTPException(e.status_code, detail=str(e))
@@ -239,48 +426,37 @@ async def score_resumes(
         if not criteria:
             raise APIError("No criteria provided", status.HTTP_400_BAD_REQUEST)
             
+        criteria_list = format_criteria(criteria)
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_RESUMES)
+        
+        async def score_file_limited(file: UploadFile) -> Dict:
+            async with semaphore:
+                return await score_file(file, criteria, criteria_list)
+        
+        outcomes = await asyncio.gather(
+            *(score_file_limited(file) for file in files),
+            return_exceptions=True
+        )
+        
         results = []
-        for file in files:
-            try:
-                text = extract_text(file)
-                candidate_name = await extract_candidate_name(text)
-                
-                scores = {"Candidate Name": candidate_name}
-                total = 0
-                
-                for criterion in criteria:
-                    prompt = f"""Evaluate this resume against: '{criterion}'
-                    Score 0-5 based on explicit mentions and relevance.
-                    Return ONLY the integer score.\n\nResume Excerpt:\n{text[:5000]}"""
-                    
-                    response = await get_llm_response(
-                        prompt=prompt,
-                        system_msg="You are a technical recruiter. Score resumes objectively."
-                    )
-                    
-                    score = validate_score(int(response.strip()))
-                    scores[criterion] = score
-                    total += score
-                
-                scores["Total Score"] = total
-                results.append(scores)
-            
-            except Exception as e:
-                logger.warning(f"Skipped {file.filename}: {str(e)}")
+        for file, outcome in zip(files, outcomes):
+            if isinstance(outcome, BaseException):
+                logger.warning(f"Skipped {file.filename}: {str(outcome)}")
                 continue
+            results.append(outcome)
                 
         if not results:
             raise APIError("No valid resumes processed", status.HTTP_400_BAD_REQUEST)
         
         # Create CSV with sanitized headers
-        df = pd.DataFrame(results)
-        sanitized_columns = {col: sanitize_column_name(col) for col in df.columns}
-        df.rename(columns=sanitized_columns, inplace=True)
+        columns = list(results[0].keys())
+        buffer = StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(sanitize_column_name(col) for col in columns)
+        writer.writerows([row[col] for col in columns] for row in results)
         
         # Generate CSV
-        output = BytesIO()
-        df.to_csv(output, index=False, encoding="utf-8")
-        output.seek(0)
+        output = BytesIO(buffer.getvalue().encode("utf-8"))
         
         return StreamingResponse(
             output,
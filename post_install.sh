@@ -3,6 +3,3 @@
 
 # Install Python dependencies
 pip install -r requirements.txt
-
-# Download NLTK data
-python -m nltk.downloader punkt